@@ -0,0 +1,26 @@
+"""Generate responsive variants for gallery photos uploaded before the image pipeline.
+
+Usage: python backfill_images.py [--force] [--concurrency N]
+"""
+import argparse
+import asyncio
+
+import server
+
+
+async def main(force: bool, concurrency: int):
+    try:
+        counts = await server.backfill_gallery_images(force=force, concurrency=concurrency)
+        print(f"Backfill done: {counts}")
+    finally:
+        if server.image_pool is not None:
+            server.image_pool.shutdown()
+        server.client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--force", action="store_true", help="reprocess photos that already have variants")
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+    asyncio.run(main(args.force, args.concurrency))
@@ -0,0 +1,87 @@
+"""Benchmark the API against the in-memory database engine, no MongoDB needed.
+
+Seeds the mock database, then times the hot read routes in-process and prints
+latency percentiles together with the engine's index lookups / collection
+scans. Run with --no-indexes to see what the id/username hash indexes buy.
+
+Usage: python benchmark_api.py [--requests 500] [--articles 2000] [--tasks 2000] [--no-indexes]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+if __name__ == "__main__":
+    if "--no-indexes" in sys.argv:
+        os.environ["MOCK_DB_INDEXES"] = ""
+    os.environ.pop("MONGO_URL", None)  # always run on the in-memory engine
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+import server
+
+
+async def seed(articles: int, tasks: int) -> list:
+    now = datetime.now(timezone.utc)
+    article_ids = [str(uuid.uuid4()) for _ in range(articles)]
+    await server.db.articles.insert_many([{
+        "id": article_id, "title": f"Article {i}", "content": "<p>" + "lorem ipsum " * 200 + "</p>",
+        "excerpt": "", "preview": "lorem ipsum", "cover_image": "", "published": True, "likes": 0,
+        "comments": [], "comment_count": 0, "created_at": (now - timedelta(minutes=i)).isoformat(),
+        "updated_at": now.isoformat()
+    } for i, article_id in enumerate(article_ids)])
+    await server.db.tasks.insert_many([{
+        "id": str(uuid.uuid4()), "title": f"Task {i}", "description": "", "completed": i % 3 == 0,
+        "created_at": (now - timedelta(minutes=i)).isoformat(), "updated_at": now.isoformat()
+    } for i in range(tasks)])
+    return article_ids
+
+
+async def time_route(http: httpx.AsyncClient, label: str, requests: int, make_url) -> dict:
+    timings = []
+    for i in range(requests):
+        started = time.perf_counter()
+        response = await http.get(make_url(i))
+        timings.append((time.perf_counter() - started) * 1000)
+        response.raise_for_status()
+    timings.sort()
+    return {"route": label, "p50": statistics.median(timings),
+            "p95": timings[int(len(timings) * 0.95) - 1], "rps": requests / (sum(timings) / 1000)}
+
+
+async def main(requests: int, articles: int, tasks: int):
+    async with server.app.router.lifespan_context(server.app):
+        article_ids = await seed(articles, tasks)
+        login = {"username": server.ADMIN_USERNAME, "password": server.ADMIN_PASSWORD}
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as http:
+            token = (await http.post("/api/auth/login", json=login)).json()["token"]
+            routes = [
+                ("GET /articles/{id}", lambda i: f"/api/articles/{article_ids[i % len(article_ids)]}"),
+                ("GET /articles?view=summary", lambda i: "/api/articles?view=summary&limit=20"),
+                ("GET /tasks", lambda i: f"/api/tasks?token={token}&limit=50"),
+                ("GET /portfolio", lambda i: "/api/portfolio"),
+            ]
+            results = [await time_route(http, label, requests, make_url) for label, make_url in routes]
+
+    indexes = ",".join(server.MOCK_INDEXED_FIELDS) or "none"
+    print(f"{articles} articles, {tasks} tasks, {requests} requests per route, hash indexes: {indexes}")
+    for row in results:
+        print(f"  {row['route']:<28} p50 {row['p50']:7.2f} ms   p95 {row['p95']:7.2f} ms   {row['rps']:7.0f} req/s")
+    for name in ("articles", "tasks", "portfolio"):
+        print(f"  db.{name:<10} {server.db[name].metrics}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--articles", type=int, default=2000)
+    parser.add_argument("--tasks", type=int, default=2000)
+    parser.add_argument("--no-indexes", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.articles, args.tasks))
@@ -0,0 +1,38 @@
+"""Pick a BCRYPT_ROUNDS value for this machine.
+
+Times one bcrypt hash per cost factor and recommends the highest cost that
+stays under the target latency. Run it on the production hardware.
+
+Usage: python benchmark_bcrypt.py [--target-ms 250] [--min 10] [--max 15]
+"""
+import argparse
+import time
+
+import bcrypt
+
+
+def time_hash(rounds: int, samples: int = 3) -> float:
+    best = float("inf")
+    for _ in range(samples):
+        started = time.perf_counter()
+        bcrypt.hashpw(b"benchmark-password", bcrypt.gensalt(rounds))
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target-ms", type=float, default=250)
+    parser.add_argument("--min", type=int, default=10)
+    parser.add_argument("--max", type=int, default=15)
+    args = parser.parse_args()
+
+    chosen = args.min
+    for rounds in range(args.min, args.max + 1):
+        elapsed = time_hash(rounds)
+        print(f"rounds={rounds:2d}  {elapsed:8.1f} ms")
+        if elapsed <= args.target_ms:
+            chosen = rounds
+        else:
+            break
+    print(f"Recommended: BCRYPT_ROUNDS={chosen} (target {args.target_ms:.0f} ms per hash)")
@@ -0,0 +1,79 @@
+"""Load test for the buffered like counter.
+
+Fires concurrent POST /api/articles/{id}/like requests at the app in-process
+and counts the writes that actually reach the articles collection.
+The old route did one update_one per like, so that is the baseline.
+
+Usage: python loadtest_likes.py [--likes 20000] [--articles 20] [--concurrency 200]
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import httpx
+
+import server
+
+
+class CountingCollection:
+    """Pass-through wrapper that counts round trips and documents touched"""
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.round_trips = 0
+        self.documents_written = 0
+        if hasattr(inner, "bulk_write"):
+            self.bulk_write = self._bulk_write
+
+    async def update_one(self, *args, **kwargs):
+        self.round_trips += 1
+        self.documents_written += 1
+        return await self.inner.update_one(*args, **kwargs)
+
+    async def _bulk_write(self, operations, *args, **kwargs):
+        self.round_trips += 1
+        self.documents_written += len(operations)
+        return await self.inner.bulk_write(operations, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+
+async def main(likes: int, articles: int, concurrency: int):
+    counting = CountingCollection(server.db.articles)
+    server.db.articles = counting
+    # Every request comes from one client address; the per-IP limit would cap the run at a few dozen likes
+    server.RATE_LIMIT_ENABLED = False
+
+    ids = [f"loadtest-{i}" for i in range(articles)]
+    limiter = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as http:
+        async def like():
+            async with limiter:
+                # In-process requests never touch a socket; yield once like a real read would
+                await asyncio.sleep(0)
+                response = await http.post(f"/api/articles/{random.choice(ids)}/like")
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(like() for _ in range(likes)))
+        elapsed = time.perf_counter() - started
+        await server.like_counter.close()
+
+    print(f"likes sent:               {likes} over {articles} articles in {elapsed:.2f}s ({likes / elapsed:.0f} req/s)")
+    print(f"baseline (one $inc each): {likes} round trips, {likes} document writes")
+    print(f"buffered:                 {counting.round_trips} round trips, {counting.documents_written} document writes")
+    if counting.documents_written:
+        print(f"write amplification cut:  {likes / counting.documents_written:.0f}x fewer document writes")
+    print(f"counter metrics:          {server.like_counter.snapshot()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--likes", type=int, default=20000)
+    parser.add_argument("--articles", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.likes, args.articles, args.concurrency))
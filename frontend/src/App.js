@@ -34,6 +34,10 @@ import 'react-quill/dist/quill.snow.css';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL || "https://advance-portfolio-backend-amif.vercel.app";
 const API = BACKEND_URL + "/api";
+// Uploaded images and files are stored as /api/blobs/<hash> references
+const assetUrl = (url) => (url && url.startsWith("/api/") ? BACKEND_URL + url : url);
+// Responsive gallery variants produced by the backend image pipeline
+const variantSrcSet = (photo, type) => (photo?.variants || []).filter(v => v.type === type).map(v => `${assetUrl(v.url)} ${v.width}w`).join(", ") || undefined;
 
 
 
@@ -412,7 +416,7 @@ const AnimatedLogo = () => {
   return (
     <motion.div className="flex items-center gap-3" whileHover={{ scale: 1.05 }}>
       <motion.div className="relative w-10 h-10 rounded-full overflow-hidden border-2 border-white/20 shadow-lg bg-white/5 flex items-center justify-center p-1" animate={{ boxShadow: ["0 0 10px rgba(106, 0, 255, 0.3)", "0 0 20px rgba(255, 94, 207, 0.3)", "0 0 10px rgba(106, 0, 255, 0.3)"] }} transition={{ duration: 3, repeat: Infinity }}>
-        <img src={portfolio?.avatar_url || PROFILE_PHOTO} alt="Logo" className="w-full h-full object-contain" />
+        <img src={assetUrl(portfolio?.avatar_url) || PROFILE_PHOTO} alt="Logo" className="w-full h-full object-contain" />
       </motion.div>
       <span className="text-xl font-display font-bold bg-clip-text text-transparent" style={{ backgroundImage: portfolio?.font_style_color ? 'none' : 'linear-gradient(135deg, #6A00FF 0%, #FF5ECF 100%)', color: portfolio?.font_style_color || 'transparent' }}>{portfolio?.name || 'Firza Ilmi'}</span>
     </motion.div>
@@ -918,7 +922,7 @@ const HomePage = () => {
                   className="relative w-full h-full flex items-end justify-center"
                 >
                   <motion.img
-                    src={portfolio?.avatar_url || PROFILE_PHOTO}
+                    src={assetUrl(portfolio?.avatar_url) || PROFILE_PHOTO}
                     alt={portfolio?.name}
                     className="max-h-full object-cover filter drop-shadow-2xl rounded-[3rem] border-4 border-white/10"
                     initial={{ y: 50, opacity: 0 }}
@@ -1029,7 +1033,7 @@ const HomePage = () => {
                           const fileURL = URL.createObjectURL(blob);
                           window.open(fileURL, '_blank');
                         } else if (portfolio.cv_url) {
-                          window.open(portfolio.cv_url, '_blank');
+                          window.open(assetUrl(portfolio.cv_url), '_blank');
                         }
                       }}
                       className="gradient-bg text-white px-8 py-7 rounded-2xl shadow-xl hover:shadow-2xl transition-all duration-300 font-bold text-lg group w-full sm:w-auto"
@@ -1041,7 +1045,7 @@ const HomePage = () => {
 
                   <motion.div whileHover={{ scale: 1.05 }} whileTap={{ scale: 0.95 }}>
                     <Button asChild variant="outline" className="border-2 border-royal-purple/20 bg-white/80 backdrop-blur-sm text-royal-purple px-8 py-7 rounded-2xl shadow-lg hover:shadow-xl transition-all duration-300 font-bold text-lg group w-full sm:w-auto">
-                      <a href={portfolio.cv_data || portfolio.cv_url} download={portfolio.cv_filename || "Miryam_Abida_CV.pdf"} target="_blank" rel="noopener noreferrer">
+                      <a href={portfolio.cv_data || assetUrl(portfolio.cv_url)} download={portfolio.cv_filename || "Miryam_Abida_CV.pdf"} target="_blank" rel="noopener noreferrer">
                         <Download className="mr-3 w-6 h-6 group-hover:bounce" />
                         Download PDF
                       </a>
@@ -1068,7 +1072,7 @@ const HomePage = () => {
                 <motion.div key={project.id} initial={{ opacity: 0, y: 30 }} whileInView={{ opacity: 1, y: 0 }} viewport={{ once: true }} transition={{ delay: index * 0.1 }} whileHover={{ y: -10 }}>
                   <Card className="card-hover overflow-hidden border-0 shadow-card group h-full bg-white/50 backdrop-blur-sm">
                     <div className="relative h-48 overflow-hidden">
-                      <motion.img src={project.image} alt={project.title} className="w-full h-full object-cover" whileHover={{ scale: 1.1 }} transition={{ duration: 0.5 }} />
+                      <motion.img src={assetUrl(project.image)} alt={project.title} className="w-full h-full object-cover" whileHover={{ scale: 1.1 }} transition={{ duration: 0.5 }} />
                       <div className="absolute inset-0 bg-gradient-to-t from-black/60 to-transparent" />
                     </div>
                     <CardContent className="pt-4">
@@ -1176,7 +1180,7 @@ const ArticlesPage = () => {
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
-    api.get('/articles?published_only=true').then(setArticles).catch(console.error).finally(() => setLoading(false));
+    api.get('/articles?published_only=true&view=summary').then(setArticles).catch(console.error).finally(() => setLoading(false));
   }, []);
 
   const handleLike = async (articleId) => {
@@ -1203,16 +1207,16 @@ const ArticlesPage = () => {
             {articles.map((article, index) => (
               <motion.div key={article.id} initial={{ opacity: 0, y: 30 }} animate={{ opacity: 1, y: 0 }} transition={{ delay: index * 0.1 }} whileHover={{ y: -5 }}>
                 <Card className="card-hover overflow-hidden h-full flex flex-col">
-                  {article.cover_image && (<div className="relative h-48 overflow-hidden"><img src={article.cover_image} alt={article.title} className="w-full h-full object-cover" /></div>)}
+                  {article.cover_image && (<div className="relative h-48 overflow-hidden"><img src={assetUrl(article.cover_image)} alt={article.title} loading="lazy" className="w-full h-full object-cover" /></div>)}
                   <CardContent className="pt-4 flex-grow">
                     <h3 className="text-xl font-bold mb-2">{article.title}</h3>
-                    <p className="text-muted-foreground text-sm line-clamp-3">{article.excerpt || article.content?.replace(/<[^>]*>/g, '').substring(0, 150)}...</p>
+                    <p className="text-muted-foreground text-sm line-clamp-3">{article.excerpt || article.preview || article.content?.replace(/<[^>]*>/g, '').substring(0, 150)}</p>
                   </CardContent>
                   <CardFooter className="border-t pt-4">
                     <div className="flex items-center justify-between w-full">
                       <div className="flex items-center gap-4">
                         <button onClick={() => handleLike(article.id)} className="flex items-center gap-1 text-muted-foreground hover:text-hot-pink transition-colors"><Heart className="w-4 h-4" /><span className="text-sm">{article.likes || 0}</span></button>
-                        <span className="flex items-center gap-1 text-muted-foreground"><MessageCircle className="w-4 h-4" /><span className="text-sm">{article.comments?.length || 0}</span></span>
+                        <span className="flex items-center gap-1 text-muted-foreground"><MessageCircle className="w-4 h-4" /><span className="text-sm">{article.comment_count ?? article.comments?.length ?? 0}</span></span>
                       </div>
                       <Link to={"/articles/" + article.id}><Button variant="ghost" size="sm" className="text-royal-purple">Read More <ChevronRight className="w-4 h-4 ml-1" /></Button></Link>
                     </div>
@@ -1333,7 +1337,10 @@ const GalleryPage = () => {
           <div className="grid grid-cols-2 md:grid-cols-3 lg:grid-cols-4 gap-4">
             {photos.map((photo, index) => (
               <motion.div key={photo.id} initial={{ opacity: 0, scale: 0.9 }} animate={{ opacity: 1, scale: 1 }} transition={{ delay: index * 0.05 }} whileHover={{ scale: 1.03 }} className="group relative aspect-square rounded-xl overflow-hidden cursor-pointer shadow-card" onClick={() => setSelectedPhoto(photo)}>
-                <img src={photo.url} alt={photo.caption} className="w-full h-full object-cover transition-transform duration-500 group-hover:scale-110" />
+                <picture>
+                  <source type="image/webp" srcSet={variantSrcSet(photo, "image/webp")} sizes="(min-width: 1024px) 25vw, (min-width: 768px) 33vw, 50vw" />
+                  <img src={assetUrl(photo.url)} srcSet={variantSrcSet(photo, "image/jpeg")} sizes="(min-width: 1024px) 25vw, (min-width: 768px) 33vw, 50vw" loading="lazy" alt={photo.caption} className="w-full h-full object-cover transition-transform duration-500 group-hover:scale-110" />
+                </picture>
                 <div className="absolute inset-0 bg-gradient-to-t from-black/60 via-transparent to-transparent opacity-0 group-hover:opacity-100 transition-opacity duration-300" />
                 {photo.caption && (<div className="absolute bottom-0 left-0 right-0 p-4 text-white opacity-0 group-hover:opacity-100 transition-opacity duration-300"><p className="text-sm font-medium">{photo.caption}</p></div>)}
               </motion.div>
@@ -1342,7 +1349,7 @@ const GalleryPage = () => {
         )}
         <Dialog open={!!selectedPhoto} onOpenChange={() => setSelectedPhoto(null)}>
           <DialogContent className="max-w-4xl p-0 overflow-hidden bg-black/90">
-            {selectedPhoto && (<div className="relative"><img src={selectedPhoto.url} alt={selectedPhoto.caption} className="w-full h-auto max-h-[80vh] object-contain" />{selectedPhoto.caption && (<div className="absolute bottom-0 left-0 right-0 p-4 bg-gradient-to-t from-black/80 to-transparent"><p className="text-white text-lg">{selectedPhoto.caption}</p></div>)}</div>)}
+            {selectedPhoto && (<div className="relative"><img src={assetUrl(selectedPhoto.url)} alt={selectedPhoto.caption} className="w-full h-auto max-h-[80vh] object-contain" />{selectedPhoto.caption && (<div className="absolute bottom-0 left-0 right-0 p-4 bg-gradient-to-t from-black/80 to-transparent"><p className="text-white text-lg">{selectedPhoto.caption}</p></div>)}</div>)}
           </DialogContent>
         </Dialog>
       </div>
@@ -1783,7 +1790,7 @@ const PortfolioEditor = () => {
             <div className="flex flex-col md:flex-row items-start md:items-center gap-6 p-4 bg-royal-purple/5 rounded-2xl border border-royal-purple/10">
               <motion.div whileHover={{ scale: 1.05 }} className="relative group">
                 <Avatar className="w-24 h-24 border-4 border-royal-purple/20 shadow-xl">
-                  <AvatarImage src={portfolio?.avatar_url || PROFILE_PHOTO} />
+                  <AvatarImage src={assetUrl(portfolio?.avatar_url) || PROFILE_PHOTO} />
                   <AvatarFallback className="gradient-bg text-white text-2xl">{portfolio?.name?.charAt(0)}</AvatarFallback>
                 </Avatar>
                 <div className="absolute inset-0 flex items-center justify-center bg-black/40 opacity-0 group-hover:opacity-100 rounded-full transition-opacity cursor-pointer">
@@ -1819,7 +1826,7 @@ const PortfolioEditor = () => {
                     }} />
                     <Upload className="w-3.5 h-3.5 mr-2" /> Upload Local Photo
                   </Button>
-                  {portfolio?.avatar_url && portfolio.avatar_url.startsWith('data:') && (
+                  {portfolio?.avatar_url && (portfolio.avatar_url.startsWith('data:') || portfolio.avatar_url.startsWith('/api/blobs/')) && (
                     <Button variant="ghost" size="sm" onClick={() => updateField('avatar_url', '')} className="text-destructive hover:text-destructive hover:bg-destructive/5 text-xs h-8">
                       <Trash2 className="w-3.5 h-3.5 mr-1" /> Remove Local
                     </Button>
@@ -2272,7 +2279,7 @@ const GalleryManagerPage = () => {
                   transition={{ delay: index * 0.05 }}
                   className={"relative group rounded-xl overflow-hidden shadow-card " + (!photo.visible ? 'opacity-50' : '')}
                 >
-                  <img src={photo.url} alt={photo.caption} className="w-full aspect-square object-cover" />
+                  <img src={assetUrl(photo.url)} srcSet={variantSrcSet(photo, "image/jpeg")} sizes="25vw" loading="lazy" alt={photo.caption} className="w-full aspect-square object-cover" />
 
                   {/* Delete button - always visible on top right */}
                   <motion.button
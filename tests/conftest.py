@@ -0,0 +1,19 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import server
+
+
+@pytest.fixture(scope="session")
+def client():
+    """One app lifespan for the whole run, on the in-memory database, without per-IP limits"""
+    rate_limit_enabled, server.RATE_LIMIT_ENABLED = server.RATE_LIMIT_ENABLED, False
+    with TestClient(server.app) as test_client:
+        yield test_client
+    server.RATE_LIMIT_ENABLED = rate_limit_enabled
+
+
+@pytest.fixture(scope="session")
+def admin_auth(client):
+    login = {"username": server.ADMIN_USERNAME, "password": server.ADMIN_PASSWORD}
+    return {"token": client.post("/api/auth/login", json=login).json()["token"]}
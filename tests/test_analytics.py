@@ -0,0 +1,52 @@
+import pytest
+
+from backend import server
+
+
+def test_hyperloglog_estimates_within_a_few_percent():
+    hll = server.HyperLogLog(p=12)
+    for n in range(20000):
+        hll.add(f"visitor-{n}")
+        hll.add(f"visitor-{n}")  # repeats don't count
+    assert hll.count() == pytest.approx(20000, rel=0.05)
+
+
+def test_hyperloglog_merge_is_a_union():
+    a, b = server.HyperLogLog(p=10), server.HyperLogLog(p=10)
+    for n in range(300):
+        a.add(str(n))
+        b.add(str(n + 200))
+    a.merge(b)
+    assert a.count() == pytest.approx(500, rel=0.1)
+    assert server.HyperLogLog(p=10, registers=bytes(a.registers)).count() == a.count()
+
+
+def test_count_min_never_undercounts_and_keeps_heavy_hitters():
+    cms = server.CountMinSketch(width=64, depth=4, max_candidates=3)
+    for path, hits in {"/": 50, "/blog": 30, "/cv": 20}.items():
+        cms.add(path, hits)
+    for n in range(40):
+        cms.add(f"/rare-{n}")
+    assert all(cms.estimate(path) >= hits for path, hits in {"/": 50, "/blog": 30, "/cv": 20}.items())
+    assert [path for path, _ in cms.top(3)] == ["/", "/blog", "/cv"]
+
+
+@pytest.fixture
+def rollups(client):
+    client.portal.call(server.db.analytics_rollups.delete_many, {})
+    yield client
+    client.portal.call(server.db.analytics_rollups.delete_many, {})
+
+
+def test_rollups_feed_the_timeseries_and_top_routes(rollups, admin_auth):
+    chrome = "Mozilla/5.0 Chrome/120.0 Safari/537.36"
+    visits = [{"timestamp": "2026-03-01T10:15:00+00:00", "path": "/", "user_agent": chrome},
+              {"timestamp": "2026-03-01T10:45:00+00:00", "path": "/blog", "user_agent": chrome},
+              {"timestamp": "2026-03-01T11:05:00+00:00", "path": "/", "user_agent": "curl/8.0"}]
+    rollups.portal.call(server.update_visitor_rollups, visits)
+
+    series = rollups.get("/api/analytics/timeseries", params={**admin_auth, "granularity": "hour"}).json()["series"]
+    assert series == [{"bucket": "2026-03-01T10", "count": 2}, {"bucket": "2026-03-01T11", "count": 1}]
+    top = rollups.get("/api/analytics/top", params={**admin_auth, "dimension": "user_agent"}).json()["top"]
+    assert top == [{"key": "Chrome", "count": 2}, {"key": "Script", "count": 1}]
+    assert rollups.get("/api/analytics/top", params={**admin_auth, "dimension": "ip"}).status_code == 400
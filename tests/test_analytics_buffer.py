@@ -0,0 +1,66 @@
+import asyncio
+
+from backend import server
+
+
+class FlakyCollection:
+    def __init__(self, fail: bool):
+        self.fail = fail
+        self.docs = []
+
+    async def insert_many(self, docs):
+        if self.fail:
+            raise RuntimeError("write failed")
+        self.docs.extend(docs)
+
+
+def make_buffer(**overrides):
+    options = dict(max_size=100, batch_size=10, flush_interval=0.01, policy="drop_oldest", block_timeout=0.01)
+    options.update(overrides)
+    return server.AnalyticsWriteBuffer(**options)
+
+
+def test_hooks_only_see_batches_that_were_stored(monkeypatch):
+    collections = {"visitors": FlakyCollection(fail=True), "events": FlakyCollection(fail=False)}
+    monkeypatch.setattr(server, "db", collections)
+    buffer = make_buffer()
+    hooked = {"visitors": [], "events": []}
+    for name in hooked:
+        async def hook(docs, name=name):
+            hooked[name].extend(docs)
+        buffer.flush_hooks[name] = [hook]
+
+    asyncio.run(buffer._write([("visitors", {"n": 1}), ("events", {"n": 2})]))
+
+    assert hooked == {"visitors": [], "events": [{"n": 2}]}
+    assert buffer.metrics["write_errors"] == 1 and buffer.metrics["written"] == 1
+
+
+def test_close_drains_everything_in_batches(monkeypatch):
+    visitors = FlakyCollection(fail=False)
+    monkeypatch.setattr(server, "db", {"visitors": visitors})
+    buffer = make_buffer(batch_size=4)
+
+    async def enqueue_and_close():
+        for n in range(10):
+            await buffer.put("visitors", {"n": n})
+        await buffer.close()
+
+    asyncio.run(enqueue_and_close())
+    assert [doc["n"] for doc in visitors.docs] == list(range(10))
+    assert buffer.metrics["batches"] == 3
+
+
+def test_full_queue_drops_by_policy():
+    async def overflow(policy):
+        buffer = make_buffer(max_size=2, policy=policy)
+        buffer._ensure_started()
+        buffer._task.cancel()  # keep everything in the queue
+        for n in range(3):
+            await buffer.put("visitors", {"n": n})
+        kept = [buffer.queue.get_nowait()[1]["n"] for _ in range(buffer.queue.qsize())]
+        return kept, buffer.metrics["dropped"]
+
+    assert asyncio.run(overflow("drop_oldest")) == ([1, 2], 1)
+    assert asyncio.run(overflow("drop_newest")) == ([0, 1], 1)
+    assert asyncio.run(overflow("block")) == ([0, 1], 1)
@@ -0,0 +1,70 @@
+import pytest
+
+from backend import server
+
+
+def comment(n: int) -> dict:
+    return {"id": f"c{n}", "author_name": "reader", "content": f"comment {n}", "created_at": f"2026-01-01T00:00:{n:02d}"}
+
+
+@pytest.fixture
+def articles(client):
+    client.portal.call(server.db.articles.delete_many, {})
+    yield client
+    client.portal.call(server.db.articles.delete_many, {})
+
+
+def insert(client, **fields):
+    article = {"id": "a1", "title": "Legacy", "content": "<p>Hello</p>", "published": True, **fields}
+    client.portal.call(server.db.articles.insert_one, article)
+
+
+def stored(client) -> dict:
+    return client.portal.call(server.db.articles.find_one, {"id": "a1"}, {"_id": 0})
+
+
+def read_all(client, limit: int) -> list:
+    seen, cursor = [], None
+    while True:
+        params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+        body = client.get("/api/articles/a1/comments", params=params).json()
+        seen += [c["id"] for c in body["comments"]]
+        cursor = body["next_cursor"]
+        if not cursor:
+            return seen
+
+
+def test_comments_page_through_in_posting_order(articles):
+    insert(articles, comments=[comment(n) for n in range(7)], comment_count=7)
+    assert read_all(articles, 3) == [f"c{n}" for n in range(7)]
+    assert read_all(articles, 7) == [f"c{n}" for n in range(7)]
+
+
+def test_cursor_survives_a_rewritten_comments_array(articles):
+    insert(articles, comments=[comment(n) for n in range(6)], comment_count=6)
+    first = articles.get("/api/articles/a1/comments", params={"limit": 3}).json()
+    # An admin removes an early comment, shifting every position after it
+    remaining = [comment(n) for n in range(1, 6)]
+    articles.portal.call(server.db.articles.update_one, {"id": "a1"}, {"$set": {"comments": remaining}})
+    rest = articles.get("/api/articles/a1/comments", params={"limit": 3, "cursor": first["next_cursor"]}).json()
+    assert [c["id"] for c in rest["comments"]] == ["c3", "c4", "c5"]
+
+
+def test_first_comment_on_a_legacy_article_counts_the_existing_ones(articles):
+    insert(articles, comments=[comment(0), comment(1)])
+    response = articles.post("/api/articles/a1/comment", json={"author_name": "reader", "content": "third"})
+    assert response.status_code == 200
+    assert stored(articles)["comment_count"] == 3
+
+
+def test_comments_total_falls_back_to_the_array_on_legacy_articles(articles):
+    insert(articles, comments=[comment(0), comment(1)])
+    assert articles.get("/api/articles/a1/comments").json()["total"] == 2
+    assert stored(articles)["comment_count"] == 2
+
+
+def test_backfill_fills_comment_count_when_preview_already_exists(articles, admin_auth):
+    insert(articles, comments=[comment(0)], preview="Hello")
+    response = articles.post("/api/admin/articles/backfill", params=admin_auth)
+    assert response.json()["updated"] == 1
+    assert stored(articles)["comment_count"] == 1
@@ -0,0 +1,94 @@
+import asyncio
+import json
+import uuid
+
+import pytest
+
+from backend import server
+
+
+def feed_all(chunks):
+    tag_filter = server.AgentTagFilter()
+    visible = "".join(tag_filter.feed(chunk) for chunk in chunks) + tag_filter.flush()
+    return visible, tag_filter.tags
+
+
+def test_tag_inside_one_chunk_is_removed():
+    assert feed_all(["Done. [ADD_TASK|Write post|high|2026-02-15] Anything else?"]) == \
+        ("Done.  Anything else?", ["[ADD_TASK|Write post|high|2026-02-15]"])
+
+
+@pytest.mark.parametrize("split_at", [1, 4, 9, 10, 20, 37])
+def test_tag_split_across_chunks_never_leaks(split_at):
+    text = "[ADD_TASK|Write post|high|2026-02-15] ok"
+    tag_filter = server.AgentTagFilter()
+    first = tag_filter.feed(text[:split_at])
+    assert "[" not in first
+    rest = tag_filter.feed(text[split_at:]) + tag_filter.flush()
+    assert first + rest == " ok"
+    assert tag_filter.tags == ["[ADD_TASK|Write post|high|2026-02-15]"]
+
+
+def test_unclosed_tag_is_released_on_flush():
+    tag_filter = server.AgentTagFilter()
+    assert tag_filter.feed("Sure [ADD_TASK|Write post|hi") == "Sure "
+    assert tag_filter.flush() == "[ADD_TASK|Write post|hi"
+    assert tag_filter.tags == []
+
+
+def test_overlong_tag_candidate_is_released_without_waiting_for_the_end():
+    tag_filter = server.AgentTagFilter()
+    text = "[ADD_TASK|" + "x" * server.AgentTagFilter.MAX_TAG_LENGTH
+    assert tag_filter.feed(text).startswith("[ADD_TASK|")
+
+
+@pytest.mark.parametrize("text", [
+    "See [the docs](https://example.com) and [1].",
+    "Arrays look like [ADD, TASK] in Python.",
+    "Malformed [ADD_TASK|only two|fields] stays.",
+    "Lone bracket at the end [",
+])
+def test_text_that_only_looks_like_a_tag_is_kept(text):
+    for size in (1, 3, len(text)):
+        chunks = [text[i:i + size] for i in range(0, len(text), size)]
+        assert feed_all(chunks) == (text, [])
+
+
+def sse_events(body: str) -> list:
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_stream_route_filters_tags_and_frees_its_slot(client, monkeypatch):
+    async def fake_stream(payload, models=None):
+        for chunk in ["Added. [ADD_", "TASK|Stream test|low|2026-01-01", "] Bye"]:
+            yield chunk
+    monkeypatch.setattr(server, "stream_with_fallback", fake_stream)
+
+    response = client.post("/api/ai/chat/stream", json={"message": f"add a task {uuid.uuid4()}"})
+    events = sse_events(response.text)
+    text = "".join(data["text"] for event, data in events if event == "chunk")
+    assert "ADD_TASK" not in text and text.startswith("Added.")
+    assert events[-1][0] == "done" and events[-1][1]["actions_performed"]
+    assert server.chat_limiter.active == 0
+
+
+def test_stream_slot_is_released_when_the_client_leaves_before_the_first_byte():
+    async def scenario():
+        response = await server.chat_with_ai_stream(server.AIMessage(message="hi"))
+        assert server.chat_limiter.active == 1
+
+        async def receive():
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            raise OSError("client went away")
+
+        with pytest.raises(Exception):  # OSError, possibly wrapped in an ExceptionGroup
+            await response({"type": "http", "asgi": {"spec_version": "2.3"}}, receive, send)
+
+    asyncio.run(scenario())
+    assert server.chat_limiter.active == 0
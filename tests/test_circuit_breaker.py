@@ -0,0 +1,93 @@
+import pytest
+
+from backend import server
+
+Breaker = server.ModelCircuitBreaker
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(server.time, "monotonic", lambda: now[0])
+    return now
+
+
+def failure(status=500, message="server error"):
+    return server.GeminiError("m", message, status=status)
+
+
+def test_opens_after_threshold_consecutive_failures(clock):
+    breaker = Breaker("m")
+    for _ in range(server.GEMINI_BREAKER_THRESHOLD - 1):
+        breaker.record_failure(failure())
+        assert breaker.state == Breaker.CLOSED and breaker.allow_request()
+    breaker.record_failure(failure())
+    assert breaker.state == Breaker.OPEN
+    assert not breaker.allow_request()
+
+
+def test_quota_error_opens_at_once_for_the_retry_hint(clock):
+    breaker = Breaker("m")
+    breaker.record_failure(server.GeminiError("m", "quota", status=429, retry_after="7"))
+    assert breaker.state == Breaker.OPEN
+    clock[0] += 6.9
+    assert not breaker.allow_request()
+    clock[0] += 0.2
+    assert breaker.allow_request()
+
+
+def test_half_open_lets_exactly_one_probe_through_after_cooldown(clock):
+    breaker = Breaker("m")
+    for _ in range(server.GEMINI_BREAKER_THRESHOLD):
+        breaker.record_failure(failure())
+    clock[0] += server.GEMINI_BREAKER_COOLDOWN
+    assert breaker.allow_request()
+    assert breaker.state == Breaker.HALF_OPEN
+    assert not breaker.allow_request()  # probe already in flight
+
+
+def test_failed_probe_reopens_with_doubled_cooldown(clock):
+    breaker = Breaker("m")
+    for _ in range(server.GEMINI_BREAKER_THRESHOLD):
+        breaker.record_failure(failure())
+    clock[0] += server.GEMINI_BREAKER_COOLDOWN
+    assert breaker.allow_request()
+    breaker.record_failure(failure())
+    assert breaker.state == Breaker.OPEN
+    clock[0] += server.GEMINI_BREAKER_COOLDOWN
+    assert not breaker.allow_request()
+    clock[0] += server.GEMINI_BREAKER_COOLDOWN
+    assert breaker.allow_request()
+
+
+def test_success_resets_the_breaker(clock):
+    breaker = Breaker("m")
+    for _ in range(server.GEMINI_BREAKER_THRESHOLD):
+        breaker.record_failure(failure())
+    clock[0] += server.GEMINI_BREAKER_COOLDOWN
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == Breaker.CLOSED
+    assert (breaker.failures, breaker.trips, breaker.probe_in_flight) == (0, 0, False)
+    assert breaker.allow_request() and breaker.allow_request()
+
+
+def test_breaker_endpoints_require_admin(client):
+    assert client.get("/api/admin/ai/breakers").status_code == 422
+    assert client.get("/api/admin/ai/breakers", params={"token": "bogus"}).status_code == 401
+    assert client.post(f"/api/admin/ai/breakers/{server.GEMINI_MODELS[0]}/reset", params={"token": "bogus"}).status_code == 401
+
+
+def test_breaker_endpoints_report_and_reset(client, admin_auth, monkeypatch):
+    monkeypatch.setattr(server, "gemini_breakers", {})
+    model = server.GEMINI_MODELS[0]
+    server.get_breaker(model).record_failure(server.GeminiError(model, "quota", status=429, retry_after="60"))
+
+    models = client.get("/api/admin/ai/breakers", params=admin_auth).json()["models"]
+    assert set(models) == set(server.GEMINI_MODELS)
+    assert models[model]["state"] == "open"
+    assert models[model]["last_error"] == "quota"
+    assert 0 < models[model]["retry_in_seconds"] <= 60
+
+    assert client.post(f"/api/admin/ai/breakers/{model}/reset", params=admin_auth).json()["success"]
+    assert client.get("/api/admin/ai/breakers", params=admin_auth).json()["models"][model]["state"] == "closed"
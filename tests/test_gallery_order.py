@@ -0,0 +1,87 @@
+import time
+
+import pytest
+
+from backend import server
+
+UPLOADED_AT = 1.8e15  # microsecond timestamps, as older uploads stored them
+
+
+def test_order_between_gives_up_when_floats_run_out():
+    before, after = UPLOADED_AT, UPLOADED_AT + 1
+    for _ in range(100):
+        mid = server.gallery_order_between(before, after)
+        if mid is None:
+            break
+        assert before < mid < after
+        after = mid
+    else:
+        pytest.fail("midpoint never reported the gap as used up")
+
+
+@pytest.fixture
+def admin_client(client, admin_auth):
+    client.portal.call(server.db.gallery.delete_many, {})
+    yield client, admin_auth
+    client.portal.call(server.db.gallery.delete_many, {})
+
+
+def seed(client, orders: dict):
+    photos = [{"id": photo_id, "url": "", "visible": True, "order": order} for photo_id, order in orders.items()]
+    client.portal.call(server.db.gallery.insert_many, photos)
+
+
+def gallery_ids(client) -> list:
+    return [photo["id"] for photo in client.get("/api/gallery").json()]
+
+
+def test_repeated_moves_between_the_same_neighbours_keep_keys_distinct(admin_client):
+    client, auth = admin_client
+    seed(client, {"a": UPLOADED_AT, "b": UPLOADED_AT + 1, "x": UPLOADED_AT + 2, "y": UPLOADED_AT + 3})
+    # Keep dropping a photo right after "a", ahead of the one moved last time
+    moving, anchor = "x", "b"
+    for _ in range(60):
+        response = client.post(f"/api/gallery/{moving}/move", params=auth, json={"before_id": "a", "after_id": anchor})
+        assert response.status_code == 200
+        moving, anchor = ("y" if moving == "x" else "x"), moving
+
+    photos = client.get("/api/gallery").json()
+    orders = [photo["order"] for photo in photos]
+    assert len(set(orders)) == len(orders)
+    assert orders == sorted(orders)
+    assert [photo["id"] for photo in photos][0] == "a"
+
+
+def test_move_rejects_the_photo_as_its_own_neighbour(admin_client):
+    client, auth = admin_client
+    seed(client, {"a": 0.0, "b": 1024.0})
+    response = client.post("/api/gallery/a/move", params=auth, json={"before_id": "a", "after_id": "b"})
+    assert response.status_code == 400
+    assert gallery_ids(client) == ["a", "b"]
+
+
+def test_move_between_photos_sharing_a_key_lands_between_them(admin_client):
+    client, auth = admin_client
+    # Two uploads in the same instant: "a" sorts first only by id
+    seed(client, {"a": UPLOADED_AT, "b": UPLOADED_AT, "x": UPLOADED_AT + 5})
+    response = client.post("/api/gallery/x/move", params=auth, json={"before_id": "b", "after_id": "a"})
+    assert response.status_code == 200
+    assert gallery_ids(client) == ["b", "x", "a"]
+
+
+def test_uploads_append_without_reading_the_gallery(admin_client, monkeypatch):
+    client, auth = admin_client
+    uploaded_earlier = time.time_ns() // 1000 - 1_000_000
+    seed(client, {"a": 0.0, "b": uploaded_earlier})
+
+    def no_reads(*args, **kwargs):
+        raise AssertionError("upload read the gallery")
+
+    monkeypatch.setattr(server.db.gallery, "find", no_reads)
+    monkeypatch.setattr(server.db.gallery, "find_one", no_reads)
+    upload = {"image_data": "https://example.com/c.jpg"}
+    orders = [client.post("/api/gallery/upload", params=auth, json=upload).json()["photo"]["order"] for _ in range(3)]
+    monkeypatch.undo()
+
+    assert uploaded_earlier < orders[0] < orders[1] < orders[2]
+    assert gallery_ids(client)[:2] == ["a", "b"]
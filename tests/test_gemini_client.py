@@ -0,0 +1,130 @@
+import asyncio
+import json
+import socket
+import threading
+
+import httpx
+import pytest
+import uvicorn
+
+from backend import server
+
+
+def make_client(handler):
+    return server.GeminiClient(
+        base_url="http://gemini.test/v1beta", api_key="test-key", connect_timeout=1, read_timeout=1,
+        max_connections=2, max_concurrency=2, transport=httpx.MockTransport(handler)
+    )
+
+
+def candidate(text: str) -> dict:
+    return {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+
+
+def test_generate_returns_first_candidate_text():
+    def handler(request):
+        assert request.url.path == "/v1beta/models/gemini-test:generateContent"
+        assert request.url.params["key"] == "test-key"
+        return httpx.Response(200, json=candidate("hello"))
+
+    client = make_client(handler)
+    assert asyncio.run(client.generate("gemini-test", {"contents": []})) == "hello"
+
+
+def test_quota_error_carries_retry_info():
+    body = {"error": {"code": 429, "status": "RESOURCE_EXHAUSTED", "details": [
+        {"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": "17s"}]}}
+    client = make_client(lambda request: httpx.Response(429, json=body))
+
+    with pytest.raises(server.GeminiError) as excinfo:
+        asyncio.run(client.generate("gemini-test", {}))
+    assert excinfo.value.status == 429
+    assert server.is_quota_error(excinfo.value)
+    assert server.parse_retry_after(excinfo.value) == 17.0
+
+
+def test_timeout_becomes_gemini_error():
+    def handler(request):
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    with pytest.raises(server.GeminiError, match="ReadTimeout"):
+        asyncio.run(make_client(handler).generate("gemini-test", {}))
+
+
+def test_stream_yields_sse_chunks():
+    def handler(request):
+        assert request.url.params["alt"] == "sse"
+        events = "".join(f"data: {json.dumps(candidate(text))}\r\n\r\n" for text in ("Hel", "lo"))
+        return httpx.Response(200, text=events, headers={"content-type": "text/event-stream"})
+
+    async def collect(client):
+        return [chunk async for chunk in client.stream("gemini-test", {})]
+
+    assert asyncio.run(collect(make_client(handler))) == ["Hel", "lo"]
+
+
+def test_client_rebinds_to_a_new_event_loop():
+    client = make_client(lambda request: httpx.Response(200, json=candidate("ok")))
+    # Each asyncio.run is a fresh loop; the semaphore and pool must follow it
+    assert asyncio.run(client.generate("gemini-test", {})) == "ok"
+    assert asyncio.run(client.generate("gemini-test", {})) == "ok"
+
+
+@pytest.fixture(scope="module")
+def stub_server():
+    """A real HTTP server on an ephemeral port; records the client port of every request"""
+    seen_ports = []
+
+    async def app(scope, receive, send):
+        if scope["type"] != "http":
+            return
+        seen_ports.append(scope["client"][1])
+        while (await receive()).get("more_body"):
+            pass
+        if scope["path"].endswith("slow:generateContent"):
+            await asyncio.sleep(2)
+        body = json.dumps(candidate("stub")).encode()
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": body})
+
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    uvicorn_server = uvicorn.Server(uvicorn.Config(app, log_level="warning", lifespan="off"))
+    thread = threading.Thread(target=uvicorn_server.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    while not uvicorn_server.started:
+        threading.Event().wait(0.01)
+    yield f"http://127.0.0.1:{sock.getsockname()[1]}/v1beta", seen_ports
+    uvicorn_server.should_exit = True
+    thread.join(5)
+
+
+def test_stub_server_requests_reuse_one_pooled_connection(stub_server):
+    base_url, seen_ports = stub_server
+    client = server.GeminiClient(base_url=base_url, api_key="k", connect_timeout=1, read_timeout=1,
+                                 max_connections=2, max_concurrency=2)
+
+    async def three_calls():
+        try:
+            return [await client.generate("gemini-test", {}) for _ in range(3)]
+        finally:
+            await client.aclose()
+
+    seen_ports.clear()
+    assert asyncio.run(three_calls()) == ["stub"] * 3
+    assert len(seen_ports) == 3 and len(set(seen_ports)) == 1
+
+
+def test_stub_server_read_timeout(stub_server):
+    base_url, _ = stub_server
+    client = server.GeminiClient(base_url=base_url, api_key="k", connect_timeout=1, read_timeout=0.2,
+                                 max_connections=2, max_concurrency=2)
+
+    async def slow_call():
+        try:
+            return await client.generate("slow", {})
+        finally:
+            await client.aclose()
+
+    with pytest.raises(server.GeminiError, match="ReadTimeout"):
+        asyncio.run(slow_call())
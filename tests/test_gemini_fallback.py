@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from backend import server
+
+
+class FakeGemini:
+    """Stands in for gemini_client: per-model delay and outcome, records cancellations"""
+
+    def __init__(self, behaviour: dict):
+        self.behaviour = behaviour  # model -> (delay seconds, reply text or GeminiError)
+        self.started = []
+        self.cancelled = []
+
+    async def generate(self, model: str, payload: dict) -> str:
+        self.started.append(model)
+        delay, outcome = self.behaviour[model]
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled.append(model)
+            raise
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+@pytest.fixture
+def fake_gemini(monkeypatch):
+    monkeypatch.setattr(server, "gemini_breakers", {})
+    monkeypatch.setattr(server, "GEMINI_HEDGE_DELAY", 0.05)
+
+    def install(behaviour: dict) -> FakeGemini:
+        fake = FakeGemini(behaviour)
+        monkeypatch.setattr(server, "gemini_client", fake)
+        return fake
+    return install
+
+
+def run(models, mode):
+    return asyncio.run(server.generate_with_fallback({}, models=models, mode=mode))
+
+
+def test_default_mode_is_sequential():
+    assert server.GEMINI_FALLBACK_MODE == "sequential"
+
+
+def test_sequential_falls_through_to_the_next_model(fake_gemini):
+    fake = fake_gemini({"a": (0, server.GeminiError("a", "boom", status=500)), "b": (0, "from b")})
+    assert run(["a", "b"], "sequential") == ("from b", None)
+    assert fake.started == ["a", "b"]
+
+
+def test_hedged_starts_the_next_model_after_the_delay_and_cancels_the_loser(fake_gemini):
+    fake = fake_gemini({"slow": (5, "from slow"), "fast": (0, "from fast")})
+    assert run(["slow", "fast"], "hedged") == ("from fast", None)
+    assert fake.started == ["slow", "fast"]
+    assert fake.cancelled == ["slow"]
+    assert server.gemini_attempt_log[-1]["outcome"] == "cancelled"
+    # A cancelled attempt says nothing about the model's health
+    assert server.get_breaker("slow").state == server.ModelCircuitBreaker.CLOSED
+
+
+def test_hedged_does_not_hedge_a_fast_first_model(fake_gemini):
+    fake = fake_gemini({"a": (0, "from a"), "b": (0, "from b")})
+    assert run(["a", "b"], "hedged") == ("from a", None)
+    assert fake.started == ["a"]
+
+
+def test_race_starts_every_model_and_keeps_the_fastest(fake_gemini):
+    fake = fake_gemini({"a": (5, "from a"), "b": (0.01, "from b"), "c": (5, "from c")})
+    assert run(["a", "b", "c"], "race") == ("from b", None)
+    assert sorted(fake.started) == ["a", "b", "c"]
+    assert sorted(fake.cancelled) == ["a", "c"]
+
+
+@pytest.mark.parametrize("mode", ["sequential", "hedged", "race"])
+def test_all_models_failing_returns_the_last_error(fake_gemini, mode):
+    fake_gemini({"a": (0, server.GeminiError("a", "a down", status=500)),
+                 "b": (0.01, server.GeminiError("b", "b down", status=500))})
+    response, error = run(["a", "b"], mode)
+    assert response is None
+    assert error == "b down"
+    assert server.get_breaker("a").failures == 1
+
+
+def test_open_circuits_are_skipped_and_reported(fake_gemini):
+    fake = fake_gemini({"a": (0, "from a")})
+    server.get_breaker("a").record_failure(server.GeminiError("a", "quota", status=429))
+    response, error = run(["a"], "sequential")
+    assert (response, error) == (None, "quota")
+    assert fake.started == []
@@ -0,0 +1,46 @@
+import bcrypt
+import pytest
+
+from backend import server
+
+
+@pytest.fixture
+def bcrypt_calls(client, monkeypatch):
+    """Count bcrypt verifications; seeds one hashed user"""
+    hashed = bcrypt.hashpw(b"right password", bcrypt.gensalt(4)).decode("ascii")
+    client.portal.call(server.db.users.insert_one, {"id": "u-login", "username": "login-test", "password_hash": hashed})
+    calls = []
+    checkpw = bcrypt.checkpw
+
+    def counting_checkpw(password, hashed):
+        calls.append(password)
+        return checkpw(password, hashed)
+
+    monkeypatch.setattr(server.bcrypt, "checkpw", counting_checkpw)
+    yield calls
+    client.portal.call(server.db.users.delete_many, {"id": "u-login"})
+
+
+def login(client, username: str, password: str):
+    return client.post("/api/auth/login", json={"username": username, "password": password})
+
+
+def test_unknown_user_and_wrong_password_both_run_bcrypt(client, bcrypt_calls):
+    assert login(client, "nobody-by-this-name", "guess").status_code == 401
+    assert len(bcrypt_calls) == 1
+    assert login(client, "login-test", "guess").status_code == 401
+    assert len(bcrypt_calls) == 2
+
+
+def test_env_admin_login_does_not_burn_bcrypt(client, bcrypt_calls):
+    if client.portal.call(server.db.users.find_one, {"username": server.ADMIN_USERNAME}):
+        pytest.skip("admin is a database user here")
+    assert login(client, server.ADMIN_USERNAME, server.ADMIN_PASSWORD).status_code == 200
+    assert bcrypt_calls == []
+    assert login(client, server.ADMIN_USERNAME, "wrong").status_code == 401
+    assert len(bcrypt_calls) == 1
+
+
+def test_correct_password_logs_in(client, bcrypt_calls):
+    response = login(client, "login-test", "right password")
+    assert response.status_code == 200 and response.json()["token"]
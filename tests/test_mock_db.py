@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+from pymongo import DeleteOne, InsertOne, UpdateMany, UpdateOne
+
+from backend import server
+
+DOC = {"id": "a", "n": 5, "tags": ["x", "y"], "meta": {"views": 3}, "empty": None}
+
+
+@pytest.mark.parametrize("query, expected", [
+    ({"n": 5}, True),
+    ({"n": {"$gt": 4, "$lte": 5}}, True),
+    ({"n": {"$lt": 5}}, False),
+    ({"n": {"$gt": "4"}}, False),  # no comparison across type brackets
+    ({"n": {"$in": [1, 5]}}, True),
+    ({"n": {"$nin": [1, 5]}}, False),
+    ({"n": {"$ne": 5}}, False),
+    ({"tags": "y"}, True),  # equality matches array elements
+    ({"meta.views": {"$gte": 3}}, True),
+    ({"missing": {"$exists": False}}, True),
+    ({"missing": None}, True),
+    ({"empty": {"$exists": True}}, True),
+    ({"$or": [{"n": 1}, {"id": "a"}]}, True),
+    ({"$and": [{"n": 5}, {"id": "b"}]}, False),
+    ({"$nor": [{"n": 1}]}, True),
+])
+def test_match_operators(query, expected):
+    assert server.mock_match(DOC, query) is expected
+
+
+def test_match_rejects_unknown_operators():
+    with pytest.raises(server.OperationFailure):
+        server.mock_match(DOC, {"n": {"$regex": "5"}})
+
+
+def test_project_inclusion_exclusion_and_slice():
+    assert server.mock_project(DOC, {"_id": 0, "n": 1, "meta.views": 1}) == {"n": 5, "meta": {"views": 3}}
+    assert "tags" not in server.mock_project(DOC, {"tags": 0})
+    assert server.mock_project(DOC, {"tags": {"$slice": -1}})["tags"] == ["y"]
+    assert server.mock_project(DOC, {"id": 1, "tags": {"$slice": [1, 5]}}) == {"id": "a", "tags": ["y"]}
+
+
+def test_apply_update_operators():
+    doc = {"n": 1, "items": ["a"]}
+    server.mock_apply_update(doc, {"$inc": {"n": 2, "new": 1}, "$push": {"items": {"$each": ["b", "c"]}},
+                                   "$set": {"meta.seen": True}, "$unset": {"gone": ""}})
+    assert doc == {"n": 3, "new": 1, "items": ["a", "b", "c"], "meta": {"seen": True}}
+    server.mock_apply_update(doc, {"$setOnInsert": {"created": 1}})
+    assert "created" not in doc
+    with pytest.raises(server.OperationFailure):
+        server.mock_apply_update(doc, {"n": 4})  # replacement documents aren't updates
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture
+def collection():
+    items = server.MockCollection("items", indexed_fields=["id"])
+    run(items.insert_many([{"id": f"i{n}", "rank": n % 3, "n": n} for n in range(9)]))
+    return items
+
+
+def test_sort_skip_limit(collection):
+    cursor = collection.find({}, {"_id": 0, "id": 1}).sort([("rank", -1), ("n", 1)]).skip(1).limit(3)
+    assert [doc["id"] for doc in run(cursor.to_list(None))] == ["i5", "i8", "i1"]
+
+
+def test_indexed_lookups_skip_the_scan(collection):
+    assert run(collection.find_one({"id": "i4"}))["n"] == 4
+    assert collection.metrics["index_lookups"] == 1 and collection.metrics["scans"] == 0
+    run(collection.find_one({"n": 4}))
+    assert collection.metrics["scans"] == 1
+
+
+def test_upsert_seeds_equality_fields(collection):
+    result = run(collection.update_one({"id": "new", "n": {"$gt": 0}}, {"$setOnInsert": {"rank": 7}, "$inc": {"hits": 1}}, upsert=True))
+    assert result.upserted_id is not None and result.matched_count == 0
+    assert run(collection.find_one({"id": "new"}, {"_id": 0})) == {"id": "new", "rank": 7, "hits": 1}
+
+
+def test_bulk_write_applies_every_request(collection):
+    result = run(collection.bulk_write([
+        UpdateOne({"id": "i0"}, {"$set": {"n": 100}}),
+        UpdateMany({"rank": 1}, {"$inc": {"n": 1}}),
+        InsertOne({"id": "i9", "rank": 0, "n": 9}),
+        DeleteOne({"id": "i8"}),
+        UpdateOne({"id": "zz"}, {"$set": {"n": 0}}, upsert=True),
+    ], ordered=False))
+    assert (result.matched_count, result.modified_count, result.inserted_count,
+            result.deleted_count, result.upserted_count) == (4, 4, 1, 1, 1)
+    assert run(collection.find_one({"id": "i0"}))["n"] == 100
+    assert run(collection.find_one({"id": "i4"}))["n"] == 5
+    assert run(collection.count_documents({})) == 10
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / "mock.bson")
+    first = server.MockAsyncIOMotorClient(snapshot_path=path)
+    run(first["app"]["notes"].insert_many([{"id": "n1", "text": "hello"}, {"id": "n2", "text": "world"}]))
+    first.close()
+
+    second = server.MockAsyncIOMotorClient(snapshot_path=path)
+    notes = run(second["app"]["notes"].find({}, {"_id": 0}).sort("id", -1).to_list(None))
+    assert notes == [{"id": "n2", "text": "world"}, {"id": "n1", "text": "hello"}]
+    assert run(second["app"]["notes"].find_one({"id": "n1"}))["text"] == "hello"
+
+
+def test_unreadable_snapshot_starts_empty(tmp_path, caplog):
+    path = tmp_path / "broken.bson"
+    path.write_bytes(b"not bson")
+    client = server.MockAsyncIOMotorClient(snapshot_path=str(path))
+    assert client["app"]["notes"].docs == {}
+    assert "Could not load mock database snapshot" in caplog.text
@@ -0,0 +1,46 @@
+import json
+
+import pytest
+
+from backend import server
+
+
+@pytest.fixture
+def seeded_tasks(client, admin_auth):
+    client.portal.call(server.db.tasks.delete_many, {})
+    tasks = [{"id": f"t{n}", "title": f"Task {n}", "description": "", "completed": False,
+              "created_at": f"2026-01-01T00:00:{n // 2:02d}", "updated_at": ""} for n in range(7)]
+    client.portal.call(server.db.tasks.insert_many, tasks)
+    yield client, admin_auth
+    client.portal.call(server.db.tasks.delete_many, {})
+
+
+def test_cursor_round_trips_and_rejects_garbage():
+    cursor = server.encode_cursor({"created_at": "2026-01-01", "id": "x"}, "created_at")
+    assert server.decode_cursor(cursor) == ("2026-01-01", "x")
+    with pytest.raises(server.HTTPException) as excinfo:
+        server.decode_cursor("not-a-cursor")
+    assert excinfo.value.status_code == 400
+
+
+def test_pages_follow_the_next_cursor_through_tied_keys(seeded_tasks):
+    client, auth = seeded_tasks
+    seen, cursor = [], None
+    while True:
+        params = {**auth, "limit": 3, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/api/tasks", params=params)
+        assert response.status_code == 200
+        seen += [task["id"] for task in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+        assert 'rel="next"' in response.headers["Link"]
+    assert seen == [f"t{n}" for n in range(7)]
+
+
+def test_format_query_parameter_selects_ndjson(seeded_tasks):
+    client, auth = seeded_tasks
+    response = client.get("/api/tasks", params={**auth, "format": "ndjson", "limit": 2})
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert [json.loads(line)["id"] for line in response.text.splitlines()] == ["t0", "t1"]
+    assert client.get("/api/tasks", params={**auth, "format": "xml"}).status_code == 422
@@ -0,0 +1,65 @@
+import base64
+
+import pytest
+
+from backend import server
+
+
+@pytest.fixture
+def portfolio(client):
+    doc = {"id": "p-etag", "username": "etag-test", "name": "Etag Test", "bio": "First", "updated_at": "2026-01-01T00:00:00"}
+    client.portal.call(server.db.portfolio.insert_one, doc)
+    yield "/api/portfolio/etag-test"
+    client.portal.call(server.db.portfolio.delete_many, {"id": "p-etag"})
+
+
+def test_portfolio_etag_answers_304_until_the_portfolio_changes(client, portfolio):
+    etag = client.get(portfolio).headers["ETag"]
+    assert client.get(portfolio, headers={"If-None-Match": etag}).status_code == 304
+
+    # Written behind this worker's back (another instance): updated_at revalidates the cache
+    update = {"$set": {"bio": "Second", "updated_at": "2026-01-02T00:00:00"}}
+    client.portal.call(server.db.portfolio.update_one, {"id": "p-etag"}, update)
+    changed = client.get(portfolio, headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+    assert changed.json()["bio"] == "Second"
+
+
+def test_portfolio_fields_and_sections_trim_the_payload(client, portfolio):
+    body = client.get(portfolio, params={"fields": "bio"}).json()
+    assert set(body) == {"id", "username", "updated_at", "bio"}
+    body = client.get(portfolio, params={"sections": "experience"}).json()
+    assert "cv_data" not in body and body["experience"] == []
+    assert client.get(portfolio, params={"fields": "password"}).status_code == 400
+
+
+@pytest.fixture
+def blob(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(server, "blob_store", server.LocalBlobStore(tmp_path))
+    data_uri = "data:text/plain;base64," + base64.b64encode(b"0123456789").decode()
+    url = client.portal.call(server.externalize_data_uri, data_uri, "digits.txt")
+    assert url.startswith(server.BLOB_URL_PREFIX)
+    return url
+
+
+def test_blob_is_served_whole_and_cacheable(client, blob):
+    response = client.get(blob)
+    assert response.content == b"0123456789"
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "immutable" in response.headers["Cache-Control"]
+    assert client.get(blob, headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
+
+
+@pytest.mark.parametrize("header, status, body, content_range", [
+    ("bytes=2-5", 206, b"2345", "bytes 2-5/10"),
+    ("bytes=7-", 206, b"789", "bytes 7-9/10"),
+    ("bytes=-3", 206, b"789", "bytes 7-9/10"),
+    ("bytes=0-1,4-5", 200, b"0123456789", None),  # multi-range gets the full body
+    ("bytes=20-30", 416, None, "bytes */10"),
+])
+def test_blob_range_requests(client, blob, header, status, body, content_range):
+    response = client.get(blob, headers={"Range": header})
+    assert response.status_code == status
+    if body is not None:
+        assert response.content == body
+    assert response.headers.get("Content-Range") == content_range
@@ -0,0 +1,61 @@
+import pytest
+
+from backend import server
+
+
+class NoDatabase:
+    def __getattr__(self, name):
+        raise AssertionError(f"read db.{name} on a cached chat turn")
+
+    __getitem__ = __getattr__
+
+
+@pytest.fixture
+def cache(client):
+    cache = server.prompt_context_cache
+    cache.invalidate_portfolios()
+    cache.invalidate_tasks()
+    cache.invalidate_memories()
+    return cache
+
+
+def test_second_chat_turn_does_no_database_reads(client, cache, monkeypatch):
+    first = client.portal.call(cache.get, None)
+    hits = cache.metrics["hits"]
+    monkeypatch.setattr(server, "db", NoDatabase())
+    assert client.portal.call(cache.get, None)[:3] == first[:3]
+    assert cache.metrics["hits"] == hits + 1
+
+
+def test_task_writes_invalidate_the_cached_task_list(client, cache, admin_auth):
+    client.portal.call(cache.get, None)
+    misses = cache.metrics["tasks_misses"]
+    response = client.post("/api/tasks", params=admin_auth, json={"title": "Cache probe", "description": ""})
+    assert response.status_code == 200
+    _, tasks_context, _, _ = client.portal.call(cache.get, None)
+    assert cache.metrics["tasks_misses"] == misses + 1
+    assert "Cache probe" in tasks_context
+    client.delete(f"/api/tasks/{response.json()['task']['id']}", params=admin_auth)
+
+
+def test_context_selection_keeps_the_relevant_entries_within_budget():
+    experience = ["Data engineer building Spark pipelines", "Barista at a coffee shop"]
+    projects = ["Kubernetes operator for Spark jobs"]
+    context = {"experience": experience, "projects": projects, "index": server.BM25Index(experience + projects)}
+    memories = [{"content": "Visitor asked about coffee"}]
+    budget = server.estimate_tokens(experience[0]) + server.estimate_tokens(projects[0]) + 2
+
+    chosen = server.select_context_entries("spark experience", context, memories,
+                                           server.BM25Index([m["content"] for m in memories]), budget)
+    assert chosen == ([experience[0]], [projects[0]], [])
+
+
+def test_response_cache_reuses_answers_for_near_identical_questions():
+    cache = server.ResponseCache(max_entries=2, ttl=60, similarity=0.8)
+    cache.put("v1", "What are her main skills?", "Python and design")
+    assert cache.get("v1", "what are her main skills") == "Python and design"
+    assert cache.get("v1", "What are her main skill?") == "Python and design"
+    assert cache.get("v2", "What are her main skills?") is None  # the portfolio changed since
+    cache.put("v1", "b", "B")
+    cache.put("v1", "c", "C")
+    assert cache.metrics["evictions"] == 1 and len(cache.entries) == 2
@@ -0,0 +1,91 @@
+import asyncio
+import os
+import subprocess
+import sys
+
+import pytest
+
+from backend import server
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(server.time, "monotonic", fake)
+    return fake
+
+
+def test_bucket_allows_capacity_then_refills(clock):
+    store = server.MemoryRateLimitStore(max_keys=10)
+    take = lambda: asyncio.run(store.take("like:1.2.3.4", 2, 60))
+    assert take() == 0 and take() == 0
+    assert take() == pytest.approx(30.0)  # one token every 30 s
+    clock.now += 30
+    assert take() == 0
+
+
+def test_bucket_store_forgets_least_recently_used_keys(clock):
+    store = server.MemoryRateLimitStore(max_keys=2)
+    for key in ("a", "b", "c"):
+        asyncio.run(store.take(key, 5, 60))
+    assert list(store.buckets) == ["b", "c"]
+
+
+@pytest.fixture
+def limited(client, monkeypatch):
+    monkeypatch.setattr(server, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(server, "rate_limit_store", server.MemoryRateLimitStore(max_keys=100))
+    return client
+
+
+def comment(client, headers=None):
+    return client.post("/api/articles/missing/comment", json={"author_name": "r", "content": "hi"}, headers=headers)
+
+
+def test_route_answers_429_with_retry_after_once_the_bucket_is_empty(limited):
+    capacity, period = server.RATE_LIMITS["comment"]
+    assert all(comment(limited).status_code == 200 for _ in range(capacity))
+    response = comment(limited)
+    assert response.status_code == 429
+    assert 0 < int(response.headers["Retry-After"]) <= period
+
+
+def test_forwarded_clients_get_their_own_buckets_when_the_proxy_is_trusted(limited, monkeypatch):
+    monkeypatch.setattr(server, "RATE_LIMIT_TRUST_PROXY", True)
+    capacity, _ = server.RATE_LIMITS["comment"]
+    for _ in range(capacity):
+        comment(limited, {"X-Forwarded-For": "203.0.113.1, 10.0.0.1"})
+    assert comment(limited, {"X-Forwarded-For": "203.0.113.1"}).status_code == 429
+    assert comment(limited, {"X-Forwarded-For": "203.0.113.2"}).status_code == 200
+
+
+def test_forwarded_for_is_trusted_by_default_on_vercel():
+    env = {k: v for k, v in os.environ.items() if k != "RATE_LIMIT_TRUST_PROXY"}
+    probe = [sys.executable, "-c", "from backend import server; print(server.RATE_LIMIT_TRUST_PROXY)"]
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    trusted = subprocess.run(probe, env={**env, "VERCEL": "1"}, cwd=root, capture_output=True, text=True, check=True)
+    assert trusted.stdout.split()[-1] == "True"
+
+
+def test_concurrency_limiter_sheds_over_the_limit(clock):
+    limiter = server.ConcurrencyLimiter(limit=1)
+    started = limiter.acquire()
+    with pytest.raises(server.HTTPException) as excinfo:
+        limiter.acquire()
+    assert excinfo.value.status_code == 429
+    assert excinfo.value.headers["Retry-After"] == "5"  # the initial average run time
+
+    clock.now += 20
+    limiter.release(started)
+    assert limiter.active == 0
+    assert limiter.avg_seconds == pytest.approx(0.8 * 5.0 + 0.2 * 20)
+    limiter.acquire()
+    assert limiter.snapshot()["admitted"] == 2 and limiter.snapshot()["shed"] == 1
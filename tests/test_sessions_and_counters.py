@@ -0,0 +1,94 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from backend import server
+
+
+def session(user_id: str, expires_in: float = 3600) -> dict:
+    return {"username": user_id, "user_id": user_id, "role": "admin",
+            "expires": datetime.now(timezone.utc) + timedelta(seconds=expires_in)}
+
+
+def test_memory_sessions_are_capped_per_user_and_in_total():
+    async def scenario():
+        backend = server.MemorySessionBackend(max_per_user=2, max_total=3, sweep_interval=3600)
+        first = await backend.create(session("alice"))
+        await backend.create(session("alice"))
+        await backend.create(session("alice"))  # evicts alice's oldest
+        await backend.create(session("bob"))
+        await backend.create(session("carol"))  # evicts the least recently used overall
+        await backend.close()
+        return backend, first
+
+    backend, first = asyncio.run(scenario())
+    assert first not in backend.sessions
+    assert len(backend.sessions) == 3 and set(backend.by_user) == {"alice", "bob", "carol"}
+    assert backend.metrics["evicted_user_cap"] == 1 and backend.metrics["evicted_total_cap"] == 1
+
+
+def test_memory_sweep_drops_expired_sessions():
+    async def scenario():
+        backend = server.MemorySessionBackend(max_per_user=5, max_total=10, sweep_interval=3600)
+        expired = await backend.create(session("alice", expires_in=-1))
+        live = await backend.create(session("alice"))
+        removed = backend.sweep()
+        await backend.close()
+        return backend, expired, live, removed
+
+    backend, expired, live, removed = asyncio.run(scenario())
+    assert removed == 1 and list(backend.sessions) == [live]
+
+
+@pytest.mark.skipif(server.jwt is None, reason="pyjwt not installed")
+def test_jwt_sessions_verify_without_a_lookup_and_honour_revocation(client):
+    backend = server.JWTSessionBackend("test-secret", "HS256", server.RevocationList(refresh_interval=3600))
+
+    async def scenario():
+        token = await backend.create(session("alice"))
+        before = await backend.get(token)
+        await backend.revoke(token)
+        return before, await backend.get(token), await backend.get(token + "x")
+
+    before, after, tampered = client.portal.call(scenario)
+    assert before["username"] == "alice"
+    assert after is None and tampered is None
+
+
+class FlakyArticles:
+    def __init__(self):
+        self.fail = False
+        self.written = []
+
+    async def update_one(self, query, update, upsert=False):
+        if self.fail:
+            raise RuntimeError("write failed")
+        self.written.append((query["id"], update["$inc"]["likes"]))
+
+
+def test_buffered_likes_stay_visible_until_flushed_and_survive_failed_writes(monkeypatch):
+    articles = FlakyArticles()
+    monkeypatch.setattr(server, "db", SimpleNamespace(articles=articles))
+    monkeypatch.setattr(server, "UpdateOne", None)  # one update_one per key
+    counter = server.BufferedCounter("articles", "likes", flush_interval=3600, flush_events=1000)
+
+    async def scenario():
+        for article_id in ("a", "a", "b"):
+            counter.add(article_id)
+        doc = {"id": "a", "likes": 10}
+        counter.merge_into([doc])
+        articles.fail = True
+        await counter.flush()
+        pending_after_failure = counter.pending("a")
+        articles.fail = False
+        await counter.flush()
+        await counter.close()
+        return doc, pending_after_failure
+
+    doc, pending_after_failure = asyncio.run(scenario())
+    assert doc["likes"] == 12
+    assert pending_after_failure == 2
+    assert sorted(articles.written) == [("a", 2), ("b", 1)]
+    assert counter.pending("a") == 0
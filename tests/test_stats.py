@@ -0,0 +1,20 @@
+from backend import server
+
+
+def test_visitor_total_outlives_expired_visits(client, admin_auth):
+    db = server.db
+    client.portal.call(db.stats_counters.delete_many, {})
+    client.portal.call(db.visitors.delete_many, {})
+    client.portal.call(db.visitors.insert_many, [{"path": "/"} for _ in range(3)])
+    # First flush seeds the counter from the collection, which already holds the batch
+    client.portal.call(server.count_visitor_events, [{"path": "/"}] * 3)
+    client.portal.call(db.visitors.insert_many, [{"path": "/"} for _ in range(2)])
+    client.portal.call(server.count_visitor_events, [{"path": "/"}] * 2)
+
+    client.portal.call(db.visitors.delete_many, {})  # what the TTL index does after VISITOR_RETENTION_DAYS
+    server.stats_snapshot.invalidate()
+    assert client.get("/api/stats", params=admin_auth).json()["visitors"]["total"] == 5
+
+
+def test_finished_index_builds_are_not_kept(client):
+    assert not server.index_tasks